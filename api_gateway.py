@@ -1,12 +1,18 @@
 import os
+import json
+import threading
+import time
+import pika
 import psycopg2
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
 from psycopg2.extras import RealDictCursor
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 from dotenv import load_dotenv
 
+import arquivo_frio
+
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -17,6 +23,12 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# --- Configuração do RabbitMQ ---
+RABBITMQ_HOST = 'rabbitmq'
+NOVOS_ALERTAS_QUEUE = 'novos_alertas_queue'  # Consumida pelo motor de alertas
+RABBITMQ_TIMEOUT_SEGUNDOS = float(os.getenv('GATEWAY_RABBITMQ_TIMEOUT_SEGUNDOS', '2'))  # Limite para conectar/publicar
+ESPERA_RECONEXAO_SEGUNDOS = float(os.getenv('GATEWAY_ESPERA_RECONEXAO_SEGUNDOS', '10'))  # Pausa após uma falha
+
 # --- Configuração do Banco de Dados ---
 DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
@@ -41,6 +53,80 @@ def get_db_connection():
         print(f"Erro de conexão com o banco de dados: {e}")
         raise HTTPException(status_code=503, detail="Não foi possível conectar ao banco de dados.")
 
+class PublicadorAlertas:
+    """
+    Conexão com o RabbitMQ mantida pelo processo e compartilhada entre as requisições.
+
+    A conexão é aberta na primeira publicação e refeita quando cai. Depois de uma falha, as
+    publicações são puladas por ESPERA_RECONEXAO_SEGUNDOS, para que um RabbitMQ fora do ar não
+    faça cada criação de alerta esperar o timeout de conexão.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # O BlockingConnection do pika não é thread-safe
+        self._connection = None
+        self._channel = None
+        self._proxima_tentativa = 0.0
+
+    def _fechar(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def _canal(self):
+        if self._channel is None or self._channel.is_closed or self._connection.is_closed:
+            self._fechar()
+            self._connection = pika.BlockingConnection(pika.ConnectionParameters(
+                host=RABBITMQ_HOST,
+                socket_timeout=RABBITMQ_TIMEOUT_SEGUNDOS,
+                blocked_connection_timeout=RABBITMQ_TIMEOUT_SEGUNDOS
+            ))
+            self._channel = self._connection.channel()
+            self._channel.queue_declare(queue=NOVOS_ALERTAS_QUEUE, durable=True)
+        return self._channel
+
+    def publicar(self, body, message_id):
+        with self._lock:
+            if time.monotonic() < self._proxima_tentativa:
+                print(f"Aviso {message_id} não enviado: RabbitMQ indisponível há pouco.")
+                return
+            # Uma conexão ociosa pode ter sido fechada pelo broker: tenta de novo com uma nova
+            for tentativa in range(2):
+                try:
+                    self._canal().basic_publish(
+                        exchange='',
+                        routing_key=NOVOS_ALERTAS_QUEUE,
+                        body=body,
+                        properties=pika.BasicProperties(
+                            delivery_mode=2,  # Mensagem persistente
+                            message_id=message_id
+                        )
+                    )
+                    return
+                except (pika.exceptions.AMQPError, OSError) as e:
+                    erro = e
+                    self._fechar()
+            self._proxima_tentativa = time.monotonic() + ESPERA_RECONEXAO_SEGUNDOS
+            # Em um ambiente real, logaríamos este erro
+            print(f"Erro ao avisar o motor de alertas: {erro}")
+
+_publicador = PublicadorAlertas()
+
+def publicar_novo_alerta(alerta_criado):
+    """
+    Avisa o motor de alertas sobre um alerta recém-criado, para que ele seja avaliado
+    imediatamente contra os preços recentes. Roda como tarefa em segundo plano, depois da
+    resposta. Se o aviso falhar, o alerta ainda será carregado na próxima recarga periódica do motor.
+    """
+    _publicador.publicar(
+        json.dumps(alerta_criado, default=float),  # NUMERIC chega como Decimal
+        f"novo-alerta-{alerta_criado['id']}"
+    )
+
 # --- Modelos de Dados (Pydantic) ---
 # Define a estrutura da resposta para garantir consistência
 class VooResponse(BaseModel):
@@ -57,10 +143,15 @@ class VooResponse(BaseModel):
         
 class AlertaCreate(BaseModel):
     email_usuario: str
-    id_voo: str
+    tipo_alerta: str = 'voo'  # 'voo' (um voo específico) ou 'rota' (qualquer voo da rota)
+    id_voo: Optional[str] = None
     origem: str
     destino: str
-    preco_desejado: float
+    preco_desejado: Optional[float] = None  # Teto de preço
+    preco_minimo: Optional[float] = None  # Piso opcional, formando uma faixa de preço
+    percentual_queda: Optional[float] = None  # Dispara quando o preço cai X% abaixo do preço de referência
+    preco_referencia: Optional[float] = None  # Se omitido, usa o último preço conhecido da rota
+    percentil_historico: Optional[float] = None  # Dispara abaixo deste percentil dos preços da última semana
 
 # --- Endpoints da API ---
 @app.get("/api/v1/voos/recentes", 
@@ -75,9 +166,11 @@ def get_voos_recentes():
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
+            # Ordenar pela chave de partição permite ao PostgreSQL ler as partições
+            # da mais recente para a mais antiga e parar assim que tiver 20 linhas
             cur.execute("""
                 SELECT * FROM historico_precos
-                ORDER BY data_insercao DESC
+                ORDER BY timestamp_captura DESC
                 LIMIT 20;
             """)
             voos = cur.fetchall()
@@ -90,31 +183,127 @@ def get_voos_recentes():
         if conn:
             conn.close()
 
+@app.get("/api/v1/voos/historico",
+         response_model=List[VooResponse],
+         summary="Consulta o histórico de preços em um intervalo",
+         tags=["Voos"])
+def get_historico(inicio: datetime,
+                  fim: Optional[datetime] = None,
+                  id_voo: Optional[str] = None,
+                  origem: Optional[str] = None,
+                  destino: Optional[str] = None,
+                  limite: int = Query(500, ge=1, le=5000)):
+    """
+    Retorna os preços capturados em [inicio, fim), do mais recente para o mais antigo.
+    Os meses ainda no PostgreSQL são consultados só nas partições do intervalo; os meses
+    já arquivados são lidos dos arquivos Parquet da camada fria.
+    Limites sem fuso são interpretados como UTC, o fuso em que timestamp_captura é gravado.
+    """
+    # Os dois limites viram UTC sem fuso, então podem ser comparados entre si e com os dois níveis
+    inicio = arquivo_frio.sem_fuso(inicio)
+    fim = arquivo_frio.sem_fuso(fim) if fim is not None else arquivo_frio.agora_utc()
+    if fim <= inicio:
+        raise HTTPException(status_code=400, detail="fim deve ser posterior a inicio.")
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            # O filtro em timestamp_captura (chave de partição) faz o PostgreSQL podar as demais partições
+            cur.execute("""
+                SELECT * FROM historico_precos
+                WHERE timestamp_captura >= %s AND timestamp_captura < %s
+                  AND (%s IS NULL OR id_voo = %s)
+                  AND (%s IS NULL OR origem = %s)
+                  AND (%s IS NULL OR destino = %s)
+                ORDER BY timestamp_captura DESC
+                LIMIT %s;
+            """, (inicio, fim, id_voo, id_voo, origem, origem, destino, destino, limite))
+            voos = cur.fetchall()
+    except Exception as e:
+        print(f"Erro ao consultar histórico: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro ao processar sua solicitação.")
+    finally:
+        if conn:
+            conn.close()
+
+    # Os meses arquivados são sempre anteriores aos que estão no banco, então basta completar
+    # o resultado com os arquivos frios, mantendo a ordem decrescente
+    if len(voos) < limite:
+        try:
+            voos.extend(arquivo_frio.ler_historico(inicio, fim, id_voo, origem, destino, limite - len(voos)))
+        except Exception as e:
+            print(f"Erro ao ler arquivos frios: {e}")
+            raise HTTPException(status_code=500, detail="Ocorreu um erro ao ler o histórico arquivado.")
+    return voos
+
 @app.post("/api/v1/alertas", 
           status_code=201,
           summary="Cria um novo alerta de preço",
           tags=["Alertas"])
-def criar_alerta(alerta: AlertaCreate):
+def criar_alerta(alerta: AlertaCreate, background_tasks: BackgroundTasks):
     """
     Recebe os dados de um novo alerta e o armazena no banco de dados
-    para ser processado posteriormente.
+    para ser processado posteriormente. Retorna o alerta criado, com o id gerado
+    e o preco_referencia efetivamente usado.
     """
+    if alerta.tipo_alerta not in ('voo', 'rota'):
+        raise HTTPException(status_code=400, detail="tipo_alerta deve ser 'voo' ou 'rota'.")
+    if alerta.tipo_alerta == 'voo' and not alerta.id_voo:
+        raise HTTPException(status_code=400, detail="Alertas do tipo 'voo' exigem id_voo.")
+    if alerta.preco_desejado is None and alerta.percentual_queda is None and alerta.percentil_historico is None:
+        raise HTTPException(status_code=400, detail="Informe preco_desejado, percentual_queda e/ou percentil_historico.")
+    if alerta.percentual_queda is not None and not 0 < alerta.percentual_queda < 100:
+        raise HTTPException(status_code=400, detail="percentual_queda deve estar entre 0 e 100.")
+    if alerta.percentil_historico is not None and not 0 < alerta.percentil_historico < 100:
+        raise HTTPException(status_code=400, detail="percentil_historico deve estar entre 0 e 100.")
+    if alerta.preco_minimo is not None and alerta.preco_desejado is not None \
+            and alerta.preco_minimo > alerta.preco_desejado:
+        raise HTTPException(status_code=400, detail="preco_minimo não pode ser maior que preco_desejado.")
+
+    # Alertas de rota valem para qualquer voo, então ignoramos um id_voo eventualmente enviado
+    id_voo = alerta.id_voo if alerta.tipo_alerta == 'voo' else None
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
+            preco_referencia = alerta.preco_referencia
+            if alerta.percentual_queda is not None and preco_referencia is None:
+                # Usa o último preço capturado da rota (ou do voo) como referência da queda
+                cur.execute("""
+                    SELECT preco FROM historico_precos
+                    WHERE origem = %s AND destino = %s AND (%s IS NULL OR id_voo = %s)
+                    ORDER BY timestamp_captura DESC
+                    LIMIT 1;
+                """, (alerta.origem, alerta.destino, id_voo, id_voo))
+                ultimo = cur.fetchone()
+                if ultimo is None:
+                    raise HTTPException(status_code=400, detail="Sem histórico para a rota; informe preco_referencia.")
+                preco_referencia = ultimo['preco']
+
             cur.execute("""
-                INSERT INTO alertas (email_usuario, id_voo, origem, destino, preco_desejado)
-                VALUES (%s, %s, %s, %s, %s);
-            """, (alerta.email_usuario, alerta.id_voo, alerta.origem, alerta.destino, alerta.preco_desejado))
+                INSERT INTO alertas (email_usuario, tipo_alerta, id_voo, origem, destino,
+                                     preco_desejado, preco_minimo, percentual_queda, preco_referencia,
+                                     percentil_historico)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, email_usuario, tipo_alerta, id_voo, origem, destino, preco_desejado,
+                          preco_minimo, percentual_queda, preco_referencia, percentil_historico;
+            """, (alerta.email_usuario, alerta.tipo_alerta, id_voo, alerta.origem, alerta.destino,
+                  alerta.preco_desejado, alerta.preco_minimo, alerta.percentual_queda, preco_referencia,
+                  alerta.percentil_historico))
+            alerta_criado = cur.fetchone()
             conn.commit()
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao inserir alerta: {e}")
         raise HTTPException(status_code=500, detail="Ocorreu um erro ao criar o alerta.")
     finally:
         if conn:
             conn.close()
-    
-    return {"message": "Alerta criado com sucesso e aguardando verificação de preço."}
+
+    # O aviso ao motor não atrasa a resposta da requisição
+    background_tasks.add_task(publicar_novo_alerta, alerta_criado)
+    return {"message": "Alerta criado com sucesso e aguardando verificação de preço.", "alerta": alerta_criado}
 
 @app.get("/", include_in_schema=False)
 def root():
@@ -1,9 +1,11 @@
 import pika
-import json
 import os
 import psycopg2
-from datetime import datetime
+from psycopg2.extras import execute_values
+from datetime import datetime, timezone
 import time
+from deduplicacao import CacheDeduplicacao, id_da_mensagem
+from mensagem_preco import MensagemInvalida, validar_mensagem
 
 # --- Configurações ---
 # RABBITMQ_HOST = 'localhost' # Aqui usamos o nome do serviço localmente
@@ -21,6 +23,11 @@ DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 
+# Configurações do processamento em lote e da deduplicação
+TAMANHO_LOTE = int(os.getenv('ARQUIVADOR_TAMANHO_LOTE', '100'))  # Máximo de mensagens por INSERT
+ESPERA_LOTE_SEGUNDOS = float(os.getenv('ARQUIVADOR_ESPERA_LOTE_SEGUNDOS', '0.5'))  # Tempo máximo esperando o lote encher
+CAPACIDADE_DEDUPLICACAO = int(os.getenv('ARQUIVADOR_CAPACIDADE_DEDUPLICACAO', '100000'))  # IDs lembrados em memória
+
 def connect_postgres():
     """Conecta ao banco de dados PostgreSQL e retorna a conexão."""
     while True:
@@ -39,20 +46,51 @@ def connect_postgres():
             print(f"❌ Falha ao conectar ao PostgreSQL: {e}. Tentando novamente em 5 segundos...")
             time.sleep(5)
 
-def validate_message_data(dados_do_preco):
-    """Valida se a mensagem contém todos os campos necessários."""
-    required_fields = ['id_voo', 'origem', 'destino', 'preco', 'timestamp']
-    missing_fields = [field for field in required_fields if field not in dados_do_preco]
-    
-    if missing_fields:
-        raise ValueError(f"Mensagem malformada: campos ausentes: {missing_fields}")
-    
-    # Validações adicionais
-    if not isinstance(dados_do_preco['preco'], (int, float)) or dados_do_preco['preco'] <= 0:
-        raise ValueError("Preço deve ser um número positivo")
-    
-    if not isinstance(dados_do_preco['timestamp'], (int, float)):
-        raise ValueError("Timestamp deve ser um número")
+def salvar_lote(db_conn, linhas):
+    """
+    Insere um lote de preços com um único INSERT e retorna quantas linhas eram novas.
+    Duplicatas que escaparam do cache em memória são descartadas pela restrição única.
+    """
+    with db_conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO historico_precos (id_mensagem, id_voo, origem, destino, preco, timestamp_captura)
+            VALUES %s
+            ON CONFLICT (id_mensagem, timestamp_captura) DO NOTHING;
+        """, linhas, page_size=len(linhas))
+        inseridas = cur.rowcount
+    db_conn.commit()
+    return inseridas
+
+def salvar_com_bisseccao(db_conn, lote):
+    """
+    Grava um lote de itens (delivery_tag, id_mensagem, linha). Se o banco rejeitar o lote,
+    divide-o ao meio e tenta cada metade, até isolar as linhas que falham sozinhas.
+    Retorna (linhas novas inseridas, lista de (item rejeitado, erro)).
+
+    Se a conexão com o banco caiu, nenhuma linha é culpada: o erro é propagado para que
+    o lote inteiro volte para a fila.
+    """
+    try:
+        return salvar_lote(db_conn, [linha for _, _, linha in lote]), []
+    except psycopg2.Error as db_error:
+        if db_conn.closed:
+            raise
+        db_conn.rollback()
+        if len(lote) == 1:
+            return 0, [(lote[0], db_error)]
+
+    meio = len(lote) // 2
+    inseridas_inicio, rejeitadas_inicio = salvar_com_bisseccao(db_conn, lote[:meio])
+    inseridas_fim, rejeitadas_fim = salvar_com_bisseccao(db_conn, lote[meio:])
+    return inseridas_inicio + inseridas_fim, rejeitadas_inicio + rejeitadas_fim
+
+def fechar_conexao_rabbitmq(connection):
+    """Fecha a conexão com o RabbitMQ sem propagar erros; as mensagens sem ack voltam para a fila."""
+    try:
+        if connection is not None and connection.is_open:
+            connection.close()
+    except Exception as e:
+        print(f"⚠️  Erro ao fechar a conexão com o RabbitMQ: {e}")
 
 def check_dlq_status(channel):
     """Verifica o status da Dead Letter Queue e retorna informações sobre mensagens."""
@@ -83,6 +121,8 @@ def setup_dlq_infrastructure(channel):
 
 def main():
     db_conn = connect_postgres()
+    ids_processados = CacheDeduplicacao(CAPACIDADE_DEDUPLICACAO)
+    connection = None
     
     while True:
         try:
@@ -111,77 +151,98 @@ def main():
             queue_name = result.method.queue
             channel.queue_bind(exchange=EXCHANGE_NAME, queue=queue_name)
             
-            # Configurar QoS para processar uma mensagem por vez
-            channel.basic_qos(prefetch_count=1)
+            # Configurar QoS para receber um lote inteiro de mensagens sem confirmação
+            channel.basic_qos(prefetch_count=TAMANHO_LOTE)
 
             print("✅ [Arquivador] Pronto com DLQ configurada. Aguardando preços...")
 
-            def callback(ch, method, properties, body):
-                try:
-                    # Tentativa de parsing JSON com tratamento específico
-                    try:
-                        dados_do_preco = json.loads(body)
-                    except json.JSONDecodeError as e:
-                        raise ValueError(f"Mensagem não é um JSON válido: {e}")
-                    
-                    print(f" [📥] Preço recebido: {dados_do_preco.get('preco', 'N/A')}")
-                    
-                    # Valida a estrutura da mensagem
-                    validate_message_data(dados_do_preco)
-
-                    # Tentativa de inserção no banco com rollback automático
+            lote = []  # (delivery_tag, id_mensagem, linha a inserir)
+            ids_no_lote = set()
+
+            # consume() com inactivity_timeout devolve (None, None, None) quando a fila fica ociosa,
+            # o que nos permite gravar o lote mesmo que ele não tenha enchido
+            # MUDANÇA IMPORTANTE: auto_ack=False para controle manual de acknowledgment
+            for method, properties, body in channel.consume(queue=queue_name, auto_ack=False,
+                                                            inactivity_timeout=ESPERA_LOTE_SEGUNDOS):
+                if body is not None:
                     try:
-                        with db_conn.cursor() as cur:
-                            # Converte o timestamp UNIX para um objeto datetime
-                            timestamp_captura = datetime.fromtimestamp(dados_do_preco['timestamp'])
-
-                            insert_query = """
-                                INSERT INTO historico_precos (id_voo, origem, destino, preco, timestamp_captura)
-                                VALUES (%s, %s, %s, %s, %s);
-                            """
-                            data_tuple = (
-                                dados_do_preco['id_voo'],
-                                dados_do_preco['origem'],
-                                dados_do_preco['destino'],
-                                dados_do_preco['preco'],
-                                timestamp_captura
-                            )
-                            cur.execute(insert_query, data_tuple)
-                            db_conn.commit()
-                            print("   [💾] Dados salvos no PostgreSQL.")
-                    
-                    except (psycopg2.Error, psycopg2.OperationalError) as db_error:
-                        print(f"❌ Erro de banco de dados: {db_error}")
-                        db_conn.rollback()
-                        # Para erros de BD, rejeitamos sem requeue para evitar loop infinito
-                        raise db_error
-                    
-                    # Confirma o sucesso do processamento
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
-
-                except Exception as error:
-                    print(f"❌ Erro ao processar mensagem: {error}")
-                    print(f"   -> Mensagem: {body.decode('utf-8', errors='replace')}")
+                        # Parsing do JSON e validação da estrutura numa única passada
+                        dados_do_preco = validar_mensagem(body)
+                        print(f" [📥] Preço recebido: {dados_do_preco['preco']}")
+
+                        # Converte o timestamp UNIX para um datetime em UTC, sem fuso (formato de timestamp_captura)
+                        # (um timestamp em milissegundos, por exemplo, cai fora do intervalo de datas)
+                        timestamp_captura = datetime.fromtimestamp(
+                            dados_do_preco['timestamp'], timezone.utc).replace(tzinfo=None)
+
+                    except (MensagemInvalida, ValueError, OverflowError, OSError) as error:
+                        print(f"❌ Erro ao processar mensagem: {error}")
+                        print(f"   -> Mensagem: {body.decode('utf-8', errors='replace')}")
+                        print(f"   -> Rejeitando mensagem e enviando para a DLQ.")
+
+                        # Rejeita a mensagem SEM recolocá-la na fila original (requeue=False)
+                        # Isso fará com que ela seja enviada para a DLQ
+                        channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                        continue
+
+                    # Reentregas já gravadas são descartadas sem ir ao banco
+                    id_mensagem = id_da_mensagem(properties, body)
+                    if id_mensagem in ids_processados or id_mensagem in ids_no_lote:
+                        print(f"   [♻️] Mensagem duplicada {id_mensagem} descartada.")
+                        channel.basic_ack(delivery_tag=method.delivery_tag)
+                        continue
+
+                    lote.append((method.delivery_tag, id_mensagem, (
+                        id_mensagem,
+                        dados_do_preco['id_voo'],
+                        dados_do_preco['origem'],
+                        dados_do_preco['destino'],
+                        dados_do_preco['preco'],
+                        timestamp_captura
+                    )))
+                    ids_no_lote.add(id_mensagem)
+                    if len(lote) < TAMANHO_LOTE:
+                        continue
+
+                if not lote:
+                    continue
+
+                # Uma linha rejeitada pelo banco não derruba o lote: só ela vai para a DLQ
+                inseridas, rejeitadas = salvar_com_bisseccao(db_conn, lote)
+                print(f"   [💾] Lote de {len(lote)} mensagem(ns) salvo no PostgreSQL ({inseridas} nova(s)).")
+
+                for (delivery_tag, id_mensagem, _), db_error in rejeitadas:
+                    print(f"❌ Erro de banco de dados na mensagem {id_mensagem}: {db_error}")
+                    # Para erros de BD, rejeitamos sem requeue para evitar loop infinito
                     print(f"   -> Rejeitando mensagem e enviando para a DLQ.")
-                    
-                    # Rejeita a mensagem SEM recolocá-la na fila original (requeue=False)
-                    # Isso fará com que ela seja enviada para a DLQ
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
 
-            # MUDANÇA IMPORTANTE: auto_ack=False para controle manual de acknowledgment
-            channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=False)
-            channel.start_consuming()
+                if not rejeitadas:
+                    # Confirma de uma vez todas as mensagens do lote
+                    channel.basic_ack(delivery_tag=lote[-1][0], multiple=True)
+
+                ids_rejeitados = {id_mensagem for (_, id_mensagem, _), _ in rejeitadas}
+                for delivery_tag, id_mensagem, _ in lote:
+                    if id_mensagem in ids_rejeitados:
+                        continue
+                    if rejeitadas:
+                        channel.basic_ack(delivery_tag=delivery_tag)
+                    ids_processados.adicionar(id_mensagem)
+
+                lote = []
+                ids_no_lote = set()
 
         except pika.exceptions.AMQPConnectionError as e:
             print(f"❌ [Arquivador] Falha ao conectar ao RabbitMQ: {e}. Tentando novamente em 5 segundos...")
+            fechar_conexao_rabbitmq(connection)
             time.sleep(5)
         except KeyboardInterrupt:
             print("\n🛑 [Arquivador] Interrompido pelo usuário.")
             try:
                 if 'channel' in locals() and not channel.is_closed:
-                    channel.stop_consuming()
+                    channel.cancel()
                     channel.close()
-                if 'connection' in locals() and not connection.is_closed:
+                if connection is not None and not connection.is_closed:
                     connection.close()
             except Exception as e:
                 print(f"⚠️  Erro ao fechar conexões: {e}")
@@ -192,6 +253,11 @@ def main():
             break
         except Exception as e:
             print(f"❌ [Arquivador] Erro inesperado: {e}")
+            # Fecha a conexão antiga para que o lote ainda sem ack volte para a fila imediatamente
+            fechar_conexao_rabbitmq(connection)
+            if db_conn.closed:
+                print("📦 Conexão com o PostgreSQL perdida. Reconectando...")
+                db_conn = connect_postgres()
             time.sleep(5)
 
 if __name__ == '__main__':
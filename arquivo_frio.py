@@ -0,0 +1,128 @@
+"""
+Camada fria do histórico de preços.
+
+As partições antigas de `historico_precos` são desanexadas pelo gerenciador_particoes.py e exportadas
+para arquivos Parquet compactados (um por mês) neste diretório. O API Gateway lê esses arquivos
+quando uma consulta de histórico cobre meses que já não estão no PostgreSQL.
+
+Nos dois níveis, timestamp_captura é um instante UTC sem fuso: o arquivador grava assim, e as
+consultas convertem seus limites para esse formato com `sem_fuso` antes de comparar.
+"""
+
+import os
+import re
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DIRETORIO_ARQUIVO_FRIO = os.getenv('DIRETORIO_ARQUIVO_FRIO', 'dados_frios')
+COMPRESSAO = 'zstd'
+
+# Mesmas colunas da tabela historico_precos (timestamps sem fuso, copiados como estão no banco)
+ESQUEMA = pa.schema([
+    ('id', pa.int64()),
+    ('id_voo', pa.string()),
+    ('origem', pa.string()),
+    ('destino', pa.string()),
+    ('preco', pa.float64()),
+    ('timestamp_captura', pa.timestamp('us')),
+    ('data_insercao', pa.timestamp('us')),
+])
+
+PADRAO_ARQUIVO = re.compile(r'^historico_precos_(\d{4})_(\d{2})\.parquet$')
+
+def inicio_do_mes(data):
+    return datetime(data.year, data.month, 1)
+
+def proximo_mes(inicio_mes):
+    if inicio_mes.month == 12:
+        return datetime(inicio_mes.year + 1, 1, 1)
+    return datetime(inicio_mes.year, inicio_mes.month + 1, 1)
+
+def mes_anterior(inicio_mes):
+    if inicio_mes.month == 1:
+        return datetime(inicio_mes.year - 1, 12, 1)
+    return datetime(inicio_mes.year, inicio_mes.month - 1, 1)
+
+def agora_utc():
+    """Instante atual em UTC sem fuso, no formato de timestamp_captura."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def sem_fuso(data):
+    """
+    Converte datetimes com fuso para UTC sem fuso, o formato de timestamp_captura.
+    Datetimes sem fuso são considerados já em UTC.
+    """
+    if data is not None and data.tzinfo is not None:
+        return data.astimezone(timezone.utc).replace(tzinfo=None)
+    return data
+
+def caminho_do_mes(inicio_mes):
+    return os.path.join(DIRETORIO_ARQUIVO_FRIO, f"historico_precos_{inicio_mes:%Y_%m}.parquet")
+
+def listar_meses_arquivados():
+    """Retorna (início do mês, caminho) de cada arquivo frio, do mais recente para o mais antigo."""
+    if not os.path.isdir(DIRETORIO_ARQUIVO_FRIO):
+        return []
+    meses = []
+    for nome in os.listdir(DIRETORIO_ARQUIVO_FRIO):
+        correspondencia = PADRAO_ARQUIVO.match(nome)
+        if correspondencia:
+            inicio_mes = datetime(int(correspondencia.group(1)), int(correspondencia.group(2)), 1)
+            meses.append((inicio_mes, os.path.join(DIRETORIO_ARQUIVO_FRIO, nome)))
+    return sorted(meses, reverse=True)
+
+def exportar_mes(inicio_mes, lotes_de_linhas):
+    """
+    Grava em Parquet as linhas de um mês, recebidas em lotes de tuplas na ordem de ESQUEMA.
+
+    O arquivo é escrito com nome temporário e só é renomeado no fim, então um arquivo
+    com o nome final está sempre completo. Retorna a quantidade de linhas exportadas.
+    """
+    os.makedirs(DIRETORIO_ARQUIVO_FRIO, exist_ok=True)
+    caminho = caminho_do_mes(inicio_mes)
+    caminho_temporario = caminho + '.tmp'
+
+    total = 0
+    with pq.ParquetWriter(caminho_temporario, ESQUEMA, compression=COMPRESSAO) as escritor:
+        for linhas in lotes_de_linhas:
+            if not linhas:
+                continue
+            arrays = []
+            for campo, valores in zip(ESQUEMA, zip(*linhas)):
+                if campo.name == 'preco':
+                    valores = [float(v) for v in valores]  # NUMERIC chega como Decimal
+                elif pa.types.is_timestamp(campo.type):
+                    valores = [sem_fuso(v) for v in valores]
+                arrays.append(pa.array(valores, type=campo.type))
+            escritor.write_table(pa.Table.from_arrays(arrays, schema=ESQUEMA))
+            total += len(linhas)
+
+    os.replace(caminho_temporario, caminho)
+    return total
+
+def ler_historico(inicio, fim, id_voo=None, origem=None, destino=None, limite=None):
+    """
+    Lê dos arquivos frios os preços com timestamp_captura em [inicio, fim), do mais recente
+    para o mais antigo. Só abre os arquivos dos meses que cruzam o intervalo, e os filtros
+    são aplicados na leitura do Parquet.
+    """
+    inicio, fim = sem_fuso(inicio), sem_fuso(fim)
+    filtros = [('timestamp_captura', '>=', inicio), ('timestamp_captura', '<', fim)]
+    if id_voo:
+        filtros.append(('id_voo', '=', id_voo))
+    if origem:
+        filtros.append(('origem', '=', origem))
+    if destino:
+        filtros.append(('destino', '=', destino))
+
+    resultado = []
+    for inicio_mes, caminho in listar_meses_arquivados():
+        if inicio_mes >= fim or proximo_mes(inicio_mes) <= inicio:
+            continue
+        tabela = pq.read_table(caminho, filters=filtros).sort_by([('timestamp_captura', 'descending')])
+        resultado.extend(tabela.to_pylist())
+        if limite is not None and len(resultado) >= limite:
+            return resultado[:limite]
+    return resultado
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da validação das mensagens de preço.
+
+Compara, por mensagem, o caminho antigo do arquivador (json.loads + validate_message_data)
+com o validador compilado de mensagem_preco.py, para mensagens válidas e malformadas, e para
+a mistura enviada pelo produtor_de_precos.py (uma mensagem malformada a cada cinco).
+Uso: python benchmark_validacao.py [repetições]
+"""
+
+import json
+import sys
+import time
+import timeit
+
+from mensagem_preco import MensagemInvalida, validar_mensagem
+
+def validate_message_data(dados_do_preco):
+    """Cópia da validação antiga do arquivador_historico.py, usada como referência."""
+    required_fields = ['id_voo', 'origem', 'destino', 'preco', 'timestamp']
+    missing_fields = [field for field in required_fields if field not in dados_do_preco]
+
+    if missing_fields:
+        raise ValueError(f"Mensagem malformada: campos ausentes: {missing_fields}")
+
+    if not isinstance(dados_do_preco['preco'], (int, float)) or dados_do_preco['preco'] <= 0:
+        raise ValueError("Preço deve ser um número positivo")
+
+    if not isinstance(dados_do_preco['timestamp'], (int, float)):
+        raise ValueError("Timestamp deve ser um número")
+
+def caminho_antigo(body):
+    try:
+        dados_do_preco = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Mensagem não é um JSON válido: {e}")
+    validate_message_data(dados_do_preco)
+    return dados_do_preco
+
+def caminho_novo(body):
+    return validar_mensagem(body)
+
+def medir(funcao, body, repeticoes):
+    """Tempo médio por mensagem em nanossegundos (melhor de 5 rodadas)."""
+    def executar():
+        try:
+            funcao(body)
+        except ValueError:  # MensagemInvalida também é um ValueError
+            pass
+    return min(timeit.repeat(executar, number=repeticoes, repeat=5)) / repeticoes * 1e9
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # Mesmas mensagens enviadas pelo produtor_de_precos.py
+    valida = json.dumps({
+        'id_voo': 'G31420', 'origem': 'NAT', 'destino': 'GRU', 'preco': 1234.56, 'timestamp': time.time()
+    }).encode()
+    sem_preco = json.dumps({
+        'id_voo': 'G31420', 'origem': 'NAT', 'destino': 'GRU', 'timestamp': time.time()
+    }).encode()
+
+    # Os dois caminhos precisam concordar antes de compararmos o tempo
+    assert caminho_novo(valida) == caminho_antigo(valida)
+    try:
+        caminho_novo(sem_preco)
+        raise AssertionError("mensagem sem preço deveria ser rejeitada")
+    except MensagemInvalida as error:
+        assert error.codigos == ['campo_ausente:preco']
+
+    print(f"⏱️  {repeticoes} mensagens por rodada (melhor de 5)\n")
+    print(f"{'mensagem':<12}{'antigo (ns)':>14}{'novo (ns)':>14}{'ganho':>10}")
+    resultados = {}
+    for nome, body in (('válida', valida), ('sem preço', sem_preco)):
+        antigo = medir(caminho_antigo, body, repeticoes)
+        novo = medir(caminho_novo, body, repeticoes)
+        resultados[nome] = (antigo, novo)
+        print(f"{nome:<12}{antigo:>14.0f}{novo:>14.0f}{antigo / novo:>9.2f}x")
+
+    # Mistura enviada pelo produtor: uma mensagem malformada a cada cinco
+    antigo = 0.8 * resultados['válida'][0] + 0.2 * resultados['sem preço'][0]
+    novo = 0.8 * resultados['válida'][1] + 0.2 * resultados['sem preço'][1]
+    print(f"{'mistura 4:1':<12}{antigo:>14.0f}{novo:>14.0f}{antigo / novo:>9.2f}x")
+
+if __name__ == '__main__':
+    main()
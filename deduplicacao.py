@@ -0,0 +1,41 @@
+"""
+Deduplicação de mensagens pelo ID, compartilhada pelos consumidores.
+
+O produtor carimba cada mensagem com um `message_id` e quem republica (o reprocessamento da DLQ)
+preserva esse ID. Assim, uma reentrega da mesma mensagem é reconhecida por um cache LRU em memória,
+de tamanho fixo, sem consultar o banco.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+def id_da_mensagem(properties, body):
+    """
+    ID estável da mensagem: o message_id definido pelo produtor ou, para mensagens
+    publicadas sem ele, o hash SHA-1 do corpo.
+    """
+    if properties is not None and properties.message_id:
+        return properties.message_id
+    return hashlib.sha1(body).hexdigest()
+
+class CacheDeduplicacao:
+    """Conjunto LRU dos IDs já processados; ao atingir a capacidade, esquece os mais antigos."""
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self._ids = OrderedDict()
+
+    def __contains__(self, id_mensagem):
+        if id_mensagem in self._ids:
+            self._ids.move_to_end(id_mensagem)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def adicionar(self, id_mensagem):
+        self._ids[id_mensagem] = None
+        self._ids.move_to_end(id_mensagem)
+        if len(self._ids) > self.capacidade:
+            self._ids.popitem(last=False)
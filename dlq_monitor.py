@@ -7,7 +7,10 @@ Permite visualizar e gerenciar mensagens na DLQ do sistema de arquivamento de pr
 import pika
 import json
 import os
+from collections import Counter
 from datetime import datetime
+from deduplicacao import id_da_mensagem
+from mensagem_preco import MensagemInvalida, validar_mensagem
 
 # Configurações (mesmas do arquivador)
 RABBITMQ_HOST = 'rabbitmq'
@@ -81,6 +84,40 @@ def consume_dlq_messages(channel, limit=10):
     
     print(f"\n✅ Processadas {messages_processed} mensagens da DLQ")
 
+def resumir_erros_dlq(channel):
+    """
+    Agrupa as mensagens da DLQ pelos códigos de erro do validador compartilhado, sem removê-las.
+    Mensagens válidas foram para a DLQ por outro motivo (falha no banco ou TTL expirado),
+    indicado pelo cabeçalho x-death.
+    """
+    total = check_dlq_messages(channel)
+    codigos = Counter()
+    ultima_tag = None
+
+    # basic_get sem ack entrega a próxima mensagem a cada chamada; no fim devolvemos todas à fila
+    for _ in range(total):
+        method, properties, body = channel.basic_get(queue=DEAD_LETTER_QUEUE, auto_ack=False)
+        if method is None:
+            break
+        ultima_tag = method.delivery_tag
+        try:
+            validar_mensagem(body)
+            mortes = (properties.headers or {}).get('x-death') or [{}]
+            motivo = mortes[0].get('reason', 'desconhecido')
+            if isinstance(motivo, bytes):
+                motivo = motivo.decode()
+            codigos[f"sem_erro_de_validacao ({motivo})"] += 1
+        except MensagemInvalida as error:
+            codigos.update(error.codigos)
+
+    if ultima_tag is not None:
+        channel.basic_nack(delivery_tag=ultima_tag, multiple=True, requeue=True)
+
+    print("\n📊 Erros encontrados na DLQ:")
+    for codigo, quantidade in codigos.most_common():
+        print(f"   - {codigo}: {quantidade}")
+    return codigos
+
 def purge_dlq(channel):
     """Remove todas as mensagens da DLQ."""
     try:
@@ -98,13 +135,15 @@ def reprocess_dlq_messages(channel, exchange_name='price_update_topic'):
     def callback(ch, method, properties, body):
         nonlocal messages_reprocessed
         try:
-            # Reenvia a mensagem para o exchange principal
+            # Reenvia a mensagem para o exchange principal, preservando o ID original
+            # para que os consumidores reconheçam a mensagem caso ela já tenha sido processada
             channel.basic_publish(
                 exchange=exchange_name,
                 routing_key='',
                 body=body,
                 properties=pika.BasicProperties(
                     delivery_mode=2,  # Torna a mensagem persistente
+                    message_id=id_da_mensagem(properties, body),
                 )
             )
             messages_reprocessed += 1
@@ -146,10 +185,11 @@ def main():
             print("2. Visualizar mensagens (sem remover)")
             print("3. Reprocessar mensagens da DLQ")
             print("4. Limpar DLQ (remover todas as mensagens)")
-            print("5. Sair")
+            print("5. Resumo dos erros (códigos de validação)")
+            print("6. Sair")
             print("="*50)
             
-            choice = input("Escolha uma opção (1-5): ").strip()
+            choice = input("Escolha uma opção (1-6): ").strip()
             
             if choice == '1':
                 check_dlq_messages(channel)
@@ -177,6 +217,9 @@ def main():
                     print("❌ Operação cancelada")
             
             elif choice == '5':
+                resumir_erros_dlq(channel)
+            
+            elif choice == '6':
                 print("👋 Saindo...")
                 break
             
@@ -0,0 +1,254 @@
+"""
+Estatísticas de preço em streaming, com memória limitada, usadas pelo motor de alertas.
+
+Para cada chave (um voo ou uma rota) mantemos:
+- a média móvel exponencial (EWMA) do preço;
+- o mínimo móvel da janela;
+- quantis aproximados da janela, com um sketch logarítmico mesclável (no estilo do DDSketch).
+
+A janela (por padrão, 7 dias) é dividida em fatias de tempo fixas. Cada fatia tem seu próprio
+sketch e mínimo, e as fatias que saem da janela são descartadas. Como os sketches são mescláveis,
+os quantis da janela saem da soma dos contadores das fatias. O resultado fica em cache e só é
+recalculado quando uma fatia expira ou depois de algumas atualizações, então consultar um quantil
+custa O(1) por mensagem.
+
+O relógio das estatísticas é o do motor: timestamps adiantados além de uma pequena tolerância
+(por exemplo, em milissegundos) são ignorados, e os demais são limitados ao instante atual, para que
+uma única mensagem não empurre a janela para o futuro.
+"""
+
+import math
+import os
+
+# Configurações das estatísticas
+JANELA_DIAS = float(os.getenv('ESTATISTICAS_JANELA_DIAS', '7'))
+DURACAO_FATIA_SEGUNDOS = int(os.getenv('ESTATISTICAS_FATIA_SEGUNDOS', str(6 * 3600)))  # 6 horas por fatia
+ALFA_EWMA = float(os.getenv('ESTATISTICAS_ALFA_EWMA', '0.1'))
+PRECISAO_RELATIVA = 0.01  # Erro relativo máximo dos quantis (1%)
+MAX_BINS = 512            # Limite de contadores por sketch
+RECALCULO_A_CADA = 50     # Atualizações toleradas antes de recalcular os quantis em cache
+MIN_AMOSTRAS_QUANTIL = int(os.getenv('ESTATISTICAS_MIN_AMOSTRAS', '30'))  # Abaixo disso o quantil não é confiável
+TOLERANCIA_FUTURO_SEGUNDOS = float(os.getenv('ESTATISTICAS_TOLERANCIA_FUTURO_SEGUNDOS', '300'))  # Diferença de relógio aceita
+
+class SketchQuantis:
+    """
+    Sketch de quantis com erro relativo garantido.
+
+    Cada valor cai no bin ceil(log(valor) / log(gama)); dois sketches com a mesma precisão
+    são mesclados somando os contadores dos bins.
+    """
+
+    def __init__(self, precisao=PRECISAO_RELATIVA, max_bins=MAX_BINS):
+        self.precisao = precisao
+        self.gama = (1 + precisao) / (1 - precisao)
+        self.log_gama = math.log(self.gama)
+        self.max_bins = max_bins
+        self.bins = {}
+        self.total = 0
+
+    def adicionar(self, valor, contagem=1):
+        if valor <= 0:
+            return  # Preços válidos são sempre positivos
+        indice = math.ceil(math.log(valor) / self.log_gama)
+        self.bins[indice] = self.bins.get(indice, 0) + contagem
+        self.total += contagem
+        if len(self.bins) > self.max_bins:
+            self._colapsar()
+
+    def _colapsar(self):
+        # Junta os bins mais altos: só nos interessam os preços baratos, então a perda
+        # de precisão fica na cauda superior
+        indices = sorted(self.bins)
+        excedentes = indices[self.max_bins - 1:]
+        self.bins[indices[self.max_bins - 1]] = sum(self.bins.pop(i) for i in excedentes)
+
+    def mesclar(self, outro):
+        for indice, contagem in outro.bins.items():
+            self.bins[indice] = self.bins.get(indice, 0) + contagem
+        self.total += outro.total
+        if len(self.bins) > self.max_bins:
+            self._colapsar()
+
+    def quantil(self, q):
+        """Retorna o quantil q (entre 0 e 1), ou None se o sketch estiver vazio."""
+        if self.total == 0:
+            return None
+        posicao = q * (self.total - 1)
+        acumulado = 0
+        for indice in sorted(self.bins):
+            acumulado += self.bins[indice]
+            if acumulado > posicao:
+                return 2 * self.gama ** indice / (self.gama + 1)
+        return 2 * self.gama ** max(self.bins) / (self.gama + 1)
+
+    def para_dict(self):
+        return {'precisao': self.precisao, 'bins': [[i, c] for i, c in self.bins.items()]}
+
+    @classmethod
+    def de_dict(cls, dados):
+        sketch = cls(precisao=dados['precisao'])
+        for indice, contagem in dados['bins']:
+            sketch.bins[indice] = contagem
+            sketch.total += contagem
+        return sketch
+
+class EstatisticasChave:
+    """EWMA, mínimo móvel e quantis da janela para uma única chave (voo ou rota)."""
+
+    def __init__(self, duracao_fatia=DURACAO_FATIA_SEGUNDOS, janela_dias=JANELA_DIAS, alfa=ALFA_EWMA):
+        self.duracao_fatia = duracao_fatia
+        self.num_fatias = max(1, int(janela_dias * 86400 // duracao_fatia))
+        self.alfa = alfa
+        self.ewma = None
+        self.fatias = {}  # número da fatia -> {'minimo': float, 'sketch': SketchQuantis}
+        self.fatia_atual = None
+        self._janela = None  # Sketch mesclado da janela, reaproveitado por todos os quantis
+        self._cache_quantis = {}
+        self._atualizacoes_pendentes = 0
+
+    def _invalidar_cache(self):
+        self._janela = None
+        self._cache_quantis.clear()
+
+    def expirar(self, fatia):
+        """Descarta as fatias que saíram da janela terminada em `fatia`."""
+        if self.fatia_atual is not None and fatia <= self.fatia_atual:
+            return
+        self.fatia_atual = fatia
+        limite = fatia - self.num_fatias
+        for antiga in [f for f in self.fatias if f <= limite]:
+            del self.fatias[antiga]
+        self._invalidar_cache()
+
+    def descartar_futuro(self, fatia):
+        """Remove as fatias posteriores a `fatia` (estado salvo com timestamps adiantados)."""
+        if self.fatia_atual is None or self.fatia_atual <= fatia:
+            return
+        for futura in [f for f in self.fatias if f > fatia]:
+            del self.fatias[futura]
+        self.fatia_atual = fatia
+        self._invalidar_cache()
+
+    def registrar(self, preco, timestamp, agora):
+        """Registra um preço; retorna False se o timestamp estiver adiantado demais em relação a `agora`."""
+        if timestamp > agora + TOLERANCIA_FUTURO_SEGUNDOS:
+            return False
+        fatia = int(min(timestamp, agora) // self.duracao_fatia)
+        self.expirar(fatia)
+        self.ewma = preco if self.ewma is None else self.alfa * preco + (1 - self.alfa) * self.ewma
+
+        if fatia <= self.fatia_atual - self.num_fatias:
+            return True  # Preço atrasado, já fora da janela
+
+        dados_fatia = self.fatias.get(fatia)
+        if dados_fatia is None:
+            dados_fatia = self.fatias[fatia] = {'minimo': preco, 'sketch': SketchQuantis()}
+        dados_fatia['minimo'] = min(dados_fatia['minimo'], preco)
+        dados_fatia['sketch'].adicionar(preco)
+
+        self._atualizacoes_pendentes += 1
+        if self._atualizacoes_pendentes >= RECALCULO_A_CADA:
+            self._invalidar_cache()
+            self._atualizacoes_pendentes = 0
+        return True
+
+    def minimo(self):
+        return min((f['minimo'] for f in self.fatias.values()), default=None)
+
+    def quantil(self, q, agora=None):
+        """Quantil q da janela (None se houver poucas amostras); usa o cache enquanto nenhuma fatia expirar."""
+        if agora is not None:
+            self.expirar(int(agora // self.duracao_fatia))
+        if q not in self._cache_quantis:
+            if self._janela is None:
+                self._janela = SketchQuantis()
+                for dados_fatia in self.fatias.values():
+                    self._janela.mesclar(dados_fatia['sketch'])
+            self._cache_quantis[q] = self._janela.quantil(q) if self._janela.total >= MIN_AMOSTRAS_QUANTIL else None
+        return self._cache_quantis[q]
+
+    def vazia(self):
+        return not self.fatias
+
+    def para_dict(self):
+        return {
+            'ewma': self.ewma,
+            'fatia_atual': self.fatia_atual,
+            'duracao_fatia': self.duracao_fatia,
+            'fatias': [[f, d['minimo'], d['sketch'].para_dict()] for f, d in self.fatias.items()],
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        estatisticas = cls(duracao_fatia=dados['duracao_fatia'])
+        estatisticas.ewma = dados['ewma']
+        estatisticas.fatia_atual = dados['fatia_atual']
+        for fatia, minimo, sketch in dados['fatias']:
+            estatisticas.fatias[fatia] = {'minimo': minimo, 'sketch': SketchQuantis.de_dict(sketch)}
+        return estatisticas
+
+def chave_voo(id_voo):
+    return f"voo:{id_voo}"
+
+def chave_rota(origem, destino):
+    return f"rota:{origem}-{destino}"
+
+class EstatisticasPrecos:
+    """Conjunto de estatísticas por voo e por rota, com controle do que precisa ir para o checkpoint."""
+
+    def __init__(self):
+        self.chaves = {}
+        self.alteradas = set()
+
+    def registrar(self, dados_do_preco, timestamp, agora):
+        """Registra o preço no voo e na rota; retorna False se o timestamp estiver adiantado demais."""
+        if timestamp > agora + TOLERANCIA_FUTURO_SEGUNDOS:
+            return False
+        for chave in (chave_voo(dados_do_preco['id_voo']),
+                      chave_rota(dados_do_preco['origem'], dados_do_preco['destino'])):
+            estatisticas = self.chaves.get(chave)
+            if estatisticas is None:
+                estatisticas = self.chaves[chave] = EstatisticasChave()
+            estatisticas.registrar(dados_do_preco['preco'], timestamp, agora)
+            self.alteradas.add(chave)
+        return True
+
+    def quantil(self, chave, q, agora=None):
+        estatisticas = self.chaves.get(chave)
+        return estatisticas.quantil(q, agora) if estatisticas is not None else None
+
+    def resumo(self, chave):
+        """EWMA e mínimo móvel da chave, enviados nas notificações dos alertas disparados."""
+        estatisticas = self.chaves.get(chave)
+        if estatisticas is None:
+            return None
+        return {'ewma': estatisticas.ewma, 'minimo': estatisticas.minimo()}
+
+    def carregar(self, linhas, agora):
+        """
+        Restaura o estado a partir das linhas (chave, estado) salvas no banco. Fatias posteriores
+        a `agora` são descartadas e a chave é marcada para ser regravada no próximo checkpoint.
+        """
+        for linha in linhas:
+            estatisticas = EstatisticasChave.de_dict(linha['estado'])
+            fatia_atual = estatisticas.fatia_atual
+            estatisticas.descartar_futuro(int(agora // estatisticas.duracao_fatia))
+            if estatisticas.fatia_atual != fatia_atual:
+                self.alteradas.add(linha['chave'])
+            self.chaves[linha['chave']] = estatisticas
+
+    def exportar_alteradas(self, agora):
+        """
+        Retorna (chave, estado) das chaves alteradas desde o último checkpoint e a lista
+        de chaves que ficaram vazias (todas as fatias expiraram) e podem ser removidas.
+        """
+        alteradas, removidas = [], []
+        for chave, estatisticas in list(self.chaves.items()):
+            estatisticas.expirar(int(agora // estatisticas.duracao_fatia))
+            if estatisticas.vazia():
+                del self.chaves[chave]
+                removidas.append(chave)
+            elif chave in self.alteradas:
+                alteradas.append((chave, estatisticas.para_dict()))
+        self.alteradas.clear()
+        return alteradas, removidas
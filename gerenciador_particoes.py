@@ -0,0 +1,163 @@
+"""
+Gerenciador das partições mensais da tabela `historico_precos`.
+
+Periodicamente:
+1. cria com antecedência as partições dos próximos meses, para que o arquivador nunca encontre um mês sem partição;
+2. desanexa as partições mais antigas que o período de retenção, exporta cada uma para um arquivo
+   Parquet na camada fria (ver arquivo_frio.py) e só então remove a tabela.
+
+Isso substitui os grandes DELETEs: apagar um mês inteiro vira um DETACH + DROP.
+"""
+
+import os
+import re
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import sql
+
+import arquivo_frio
+
+# Carrega as credenciais do banco de dados a partir das variáveis de ambiente
+DB_HOST = os.getenv('DB_HOST')
+DB_PORT = os.getenv('DB_PORT')
+DB_NAME = os.getenv('DB_NAME')
+DB_USER = os.getenv('DB_USER')
+DB_PASSWORD = os.getenv('DB_PASSWORD')
+
+TABELA = 'historico_precos'
+MESES_A_FRENTE = int(os.getenv('PARTICOES_MESES_A_FRENTE', '3'))    # Partições futuras criadas com antecedência
+MESES_RETENCAO = int(os.getenv('PARTICOES_MESES_RETENCAO', '6'))    # Meses mantidos no PostgreSQL
+INTERVALO_SEGUNDOS = int(os.getenv('PARTICOES_INTERVALO_SEGUNDOS', '3600'))
+TAMANHO_LOTE_EXPORTACAO = 50000
+
+PADRAO_PARTICAO = re.compile(r'^historico_precos_p(\d{4})_(\d{2})$')
+
+def connect_postgres():
+    """Conecta ao banco de dados PostgreSQL e retorna a conexão."""
+    while True:
+        try:
+            conn = psycopg2.connect(
+                host=DB_HOST,
+                port=DB_PORT,
+                dbname=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD
+            )
+            print("✅ [Partições] Conexão com o PostgreSQL estabelecida com sucesso.")
+            return conn
+        except psycopg2.OperationalError as e:
+            print(f"❌ [Partições] Falha ao conectar ao PostgreSQL: {e}. Tentando novamente em 5 segundos...")
+            time.sleep(5)
+
+def nome_particao(inicio_mes):
+    return f"{TABELA}_p{inicio_mes:%Y_%m}"
+
+def listar_particoes(conn):
+    """
+    Retorna (início do mês, nome, anexada) das tabelas de partição existentes.
+    Tabelas desanexadas ainda presentes vêm de uma exportação interrompida.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, (i.inhrelid IS NOT NULL) AS anexada
+            FROM pg_class c
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+            WHERE c.relkind = 'r' AND c.relname LIKE %s;
+        """, (f"{TABELA}_p%",))
+        linhas = cur.fetchall()
+    conn.commit()
+
+    particoes = []
+    for nome, anexada in linhas:
+        correspondencia = PADRAO_PARTICAO.match(nome)
+        if correspondencia:
+            inicio_mes = datetime(int(correspondencia.group(1)), int(correspondencia.group(2)), 1)
+            particoes.append((inicio_mes, nome, anexada))
+    return sorted(particoes)
+
+def criar_particoes_futuras(conn, hoje):
+    """Garante as partições do mês atual e dos próximos MESES_A_FRENTE meses."""
+    inicio_mes = arquivo_frio.inicio_do_mes(hoje)
+    with conn.cursor() as cur:
+        for _ in range(MESES_A_FRENTE + 1):
+            fim_mes = arquivo_frio.proximo_mes(inicio_mes)
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {} PARTITION OF {}
+                FOR VALUES FROM (%s) TO (%s);
+            """).format(sql.Identifier(nome_particao(inicio_mes)), sql.Identifier(TABELA)),
+                (inicio_mes, fim_mes))
+            inicio_mes = fim_mes
+    conn.commit()
+    print(f"🗓️  [Partições] Partições garantidas até {inicio_mes:%Y-%m} (exclusive).")
+
+def exportar_e_remover(conn, inicio_mes, nome):
+    """Exporta uma partição já desanexada para a camada fria e remove a tabela."""
+    identificador = sql.Identifier(nome)
+
+    def lotes():
+        # Cursor nomeado (do lado do servidor) para não carregar o mês inteiro na memória
+        with conn.cursor(name=f"exportacao_{nome}") as cur:
+            cur.execute(sql.SQL("""
+                SELECT id, id_voo, origem, destino, preco, timestamp_captura, data_insercao
+                FROM {} ORDER BY timestamp_captura;
+            """).format(identificador))
+            while True:
+                linhas = cur.fetchmany(TAMANHO_LOTE_EXPORTACAO)
+                if not linhas:
+                    break
+                yield linhas
+
+    total = arquivo_frio.exportar_mes(inicio_mes, lotes())
+    conn.commit()
+    print(f"📤 [Partições] {nome}: {total} linha(s) exportada(s) para {arquivo_frio.caminho_do_mes(inicio_mes)}")
+
+    # Só remove depois que o arquivo frio está completo no disco
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("DROP TABLE {};").format(identificador))
+    conn.commit()
+    print(f"🗑️  [Partições] {nome} removida do PostgreSQL.")
+
+def arquivar_particoes_antigas(conn, hoje):
+    """Desanexa, exporta e remove as partições que terminam antes do período de retenção."""
+    limite = arquivo_frio.inicio_do_mes(hoje)
+    for _ in range(MESES_RETENCAO):
+        limite = arquivo_frio.mes_anterior(limite)
+
+    for inicio_mes, nome, anexada in listar_particoes(conn):
+        if arquivo_frio.proximo_mes(inicio_mes) > limite:
+            continue
+        if anexada:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {};").format(
+                    sql.Identifier(TABELA), sql.Identifier(nome)))
+            conn.commit()
+            print(f"✂️  [Partições] {nome} desanexada.")
+        exportar_e_remover(conn, inicio_mes, nome)
+
+def main():
+    conn = connect_postgres()
+    print("✅ [Partições] Gerenciador de partições iniciado.")
+
+    try:
+        while True:
+            try:
+                hoje = arquivo_frio.agora_utc()  # Os meses das partições são meses em UTC
+                criar_particoes_futuras(conn, hoje)
+                arquivar_particoes_antigas(conn, hoje)
+            except (psycopg2.Error, OSError) as error:
+                print(f"❌ [Partições] Erro durante a manutenção: {error}")
+                if conn.closed:
+                    conn = connect_postgres()
+                else:
+                    conn.rollback()
+            time.sleep(INTERVALO_SEGUNDOS)
+    except KeyboardInterrupt:
+        print("\n🛑 [Partições] Interrompido pelo usuário.")
+    finally:
+        conn.close()
+        print("📦 Conexão com PostgreSQL fechada.")
+
+if __name__ == '__main__':
+    main()
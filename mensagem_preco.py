@@ -0,0 +1,72 @@
+"""
+Esquema único da mensagem de preço publicada no tópico `price_update_topic`.
+
+O esquema é compilado uma só vez num TypeAdapter do pydantic v2, que faz o parsing do JSON e a
+validação numa única passada, direto dos bytes da mensagem. Os erros viram códigos estruturados
+(por exemplo, `campo_ausente:preco`), usados nos logs dos consumidores e no resumo de erros do
+dlq_monitor.py.
+"""
+
+from typing import Annotated
+
+from pydantic import ConfigDict, Field, TypeAdapter, ValidationError
+from typing_extensions import TypedDict
+
+class MensagemPreco(TypedDict):
+    # Modo estrito: preço e timestamp precisam ser números finitos no JSON
+    # (strings, booleanos, infinitos como 1e400 e NaN são rejeitados)
+    __pydantic_config__ = ConfigDict(strict=True, allow_inf_nan=False)
+
+    id_voo: str
+    origem: str
+    destino: str
+    preco: Annotated[float, Field(gt=0)]
+    timestamp: float
+
+_VALIDADOR = TypeAdapter(MensagemPreco)
+
+# Tipos de erro do pydantic agrupados nos nossos códigos
+CODIGOS_ERRO = {
+    'json_invalid': 'json_invalido',
+    'json_type': 'json_invalido',
+    'dict_type': 'formato_invalido',
+    'missing': 'campo_ausente',
+    'string_type': 'tipo_invalido',
+    'float_type': 'tipo_invalido',
+    'float_parsing': 'tipo_invalido',
+    'finite_number': 'valor_invalido',
+    'greater_than': 'valor_invalido',
+}
+
+class MensagemInvalida(ValueError):
+    """Mensagem de preço rejeitada; `codigos` traz os códigos de erro, como `campo_ausente:preco`."""
+
+    def __init__(self, codigos):
+        self.codigos = codigos
+        super().__init__(codigos)
+
+    def __str__(self):
+        # Montada só quando a mensagem de erro é de fato exibida
+        return f"Mensagem malformada: {', '.join(self.codigos)}"
+
+def _codigo(erro):
+    codigo = CODIGOS_ERRO.get(erro['type'], erro['type'])
+    local = erro['loc']
+    if not local:
+        return codigo
+    return f"{codigo}:{local[0] if len(local) == 1 else '.'.join(map(str, local))}"
+
+def validar_mensagem(body):
+    """
+    Faz o parsing e a validação de uma mensagem de preço (bytes ou str).
+    Retorna um dicionário só com os campos do esquema ou lança MensagemInvalida.
+
+    Rejeitar continua mais caro que aceitar (o pydantic monta o ValidationError), então o caminho
+    de erro faz o mínimo: só o tipo e o local de cada erro, sem contexto nem entrada, e a exceção
+    é lançada fora do `except`, sem encadear o ValidationError.
+    """
+    try:
+        return _VALIDADOR.validate_json(body)
+    except ValidationError as e:
+        erros = e.errors(include_url=False, include_context=False, include_input=False)
+    raise MensagemInvalida([_codigo(erro) for erro in erros])
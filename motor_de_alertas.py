@@ -1,6 +1,16 @@
 """
 Este é o nosso novo worker inteligente. Ele vai ouvir todos os preços, e para cada um, verificar se algum alerta deve ser disparado.
 Este consumidor faz duas coisas: lê do tópico de preços e, quando encontra uma correspondência, publica uma nova mensagem em uma fila de trabalho específica para notificações. Isso é um padrão de arquitetura muito poderoso.
+
+Os alertas ativos ficam em memória num índice colunar (arrays NumPy agrupados por rota), recarregado periodicamente do banco.
+Os preços são consumidos em lotes e cada lote é comparado contra todos os alertas da rota com poucas operações vetorizadas,
+sem nenhum SELECT por mensagem.
+
+Alertas recém-criados chegam pela fila `novos_alertas_queue` (publicados pelo API Gateway) e são avaliados na hora
+contra uma janela em memória com o último preço de cada voo, sem esperar o próximo preço nem consultar o banco.
+
+O motor também mantém estatísticas de preço em streaming por voo e por rota (ver estatisticas_streaming.py),
+salvas periodicamente no banco, que alimentam os alertas de "preço abaixo do percentil X da última semana".
 """
 
 import pika
@@ -8,12 +18,18 @@ import json
 import os
 import psycopg2
 import time
-from psycopg2.extras import RealDictCursor
+import numpy as np
+from collections import OrderedDict
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from estatisticas_streaming import EstatisticasPrecos, chave_voo, chave_rota
+from deduplicacao import CacheDeduplicacao, id_da_mensagem
+from mensagem_preco import MensagemInvalida, validar_mensagem
 
 # --- Configurações (semelhante ao arquivador) ---
 RABBITMQ_HOST = 'rabbitmq'
 EXCHANGE_NAME = 'price_update_topic'
 NOTIFICATION_QUEUE = 'notificacoes_queue' # Nova fila para enviar notificações
+NOVOS_ALERTAS_QUEUE = 'novos_alertas_queue' # Alertas recém-criados, publicados pelo API Gateway
 
 DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
@@ -21,6 +37,23 @@ DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 
+# Configurações do processamento em lote
+TAMANHO_LOTE = int(os.getenv('MOTOR_TAMANHO_LOTE', '200'))  # Máximo de preços avaliados de uma vez
+ESPERA_LOTE_SEGUNDOS = float(os.getenv('MOTOR_ESPERA_LOTE_SEGUNDOS', '0.5'))  # Tempo máximo esperando o lote encher
+RECARGA_ALERTAS_SEGUNDOS = float(os.getenv('MOTOR_RECARGA_ALERTAS_SEGUNDOS', '30'))  # Intervalo de recarga dos alertas
+CHECKPOINT_ESTATISTICAS_SEGUNDOS = float(os.getenv('MOTOR_CHECKPOINT_ESTATISTICAS_SEGUNDOS', '60'))  # Intervalo de checkpoint das estatísticas
+JANELA_RECENTE_SEGUNDOS = float(os.getenv('MOTOR_JANELA_RECENTE_SEGUNDOS', '3600'))  # Idade máxima de um preço na janela recente
+CAPACIDADE_JANELA_RECENTE = int(os.getenv('MOTOR_CAPACIDADE_JANELA_RECENTE', '50000'))  # Voos lembrados na janela recente
+CAPACIDADE_DEDUPLICACAO = int(os.getenv('MOTOR_CAPACIDADE_DEDUPLICACAO', '100000'))  # IDs de mensagem lembrados em memória
+LIMITE_MATRIZ_AVALIACAO = int(os.getenv('MOTOR_LIMITE_MATRIZ_AVALIACAO', '1000000'))  # Células (alertas x preços) por bloco
+
+# Tipos de alerta suportados
+TIPO_VOO = 'voo'    # Um voo específico (id_voo) da rota
+TIPO_ROTA = 'rota'  # Qualquer voo da rota origem -> destino
+
+# Código usado no índice para "qualquer voo da rota"
+QUALQUER_VOO = -1
+
 def connect_postgres():
     # (Função de conexão idêntica à do arquivador_historico.py)
     while True:
@@ -32,9 +65,369 @@ def connect_postgres():
             print(f"🧠 [Motor de Alertas] Falha ao conectar ao PostgreSQL: {e}. Tentando novamente...")
             time.sleep(5)
 
+def calcular_faixa(alerta):
+    """Converte as condições de um alerta em uma faixa [piso, teto] de preço aceito."""
+    teto = np.inf
+    if alerta.get('preco_desejado') is not None:
+        teto = float(alerta['preco_desejado'])
+
+    # Queda percentual: o preço precisa ficar X% abaixo do preço de referência do alerta
+    if alerta.get('percentual_queda') is not None:
+        if alerta.get('preco_referencia') is None:
+            teto = -np.inf  # Sem referência a queda não pode ser medida, então o alerta não dispara
+        else:
+            limite_queda = float(alerta['preco_referencia']) * (1 - float(alerta['percentual_queda']) / 100)
+            teto = min(teto, limite_queda)
+
+    piso = float(alerta['preco_minimo']) if alerta.get('preco_minimo') is not None else -np.inf
+    return piso, teto
+
+class MotorVetorizado:
+    """
+    Índice colunar dos alertas ativos, agrupados por rota (origem, destino).
+
+    Cada rota guarda arrays paralelos (id, código do voo, piso, teto, percentil, ativo), de modo que
+    um lote de preços da rota é avaliado contra todos os seus alertas de uma vez.
+    """
+
+    def __init__(self, estatisticas):
+        self.rotas = {}
+        self.codigos_voo = {}
+        self.ids = set()  # IDs de todos os alertas no índice, mantidos junto com as rotas
+        self.estatisticas = estatisticas
+
+    def _codigo_voo(self, id_voo):
+        """Mapeia o id_voo textual para um inteiro, permitindo comparações vetorizadas."""
+        return self.codigos_voo.setdefault(id_voo, len(self.codigos_voo))
+
+    def _montar_indice(self, linhas):
+        """Monta os arrays colunares de uma rota a partir das suas linhas de alerta."""
+        faixas = [calcular_faixa(alerta) for alerta in linhas]
+
+        # Alertas estatísticos agrupados por (chave das estatísticas, quantil): cada grupo
+        # distinto consulta as estatísticas uma só vez por lote
+        estatisticos = [
+            (a, (chave_rota(alerta['origem'], alerta['destino']) if alerta.get('tipo_alerta') == TIPO_ROTA
+                 else chave_voo(alerta['id_voo']), float(alerta['percentil_historico']) / 100))
+            for a, alerta in enumerate(linhas) if alerta.get('percentil_historico') is not None
+        ]
+        grupos = list(dict.fromkeys(grupo for _, grupo in estatisticos))
+        numero_grupo = {grupo: g for g, grupo in enumerate(grupos)}
+        return {
+            'id': np.array([alerta['id'] for alerta in linhas], dtype=np.int64),
+            'voo': np.array([
+                QUALQUER_VOO if alerta.get('tipo_alerta') == TIPO_ROTA else self._codigo_voo(alerta['id_voo'])
+                for alerta in linhas
+            ], dtype=np.int64),
+            'piso': np.array([piso for piso, _ in faixas], dtype=np.float64),
+            'teto': np.array([teto for _, teto in faixas], dtype=np.float64),
+            'grupos_estatisticos': grupos,
+            'posicao_estatistica': np.array([a for a, _ in estatisticos], dtype=np.int64),
+            'grupo_estatistico': np.array([numero_grupo[grupo] for _, grupo in estatisticos], dtype=np.int64),
+            'ativo': np.ones(len(linhas), dtype=bool),
+            'alertas': linhas,
+        }
+
+    def carregar(self, alertas):
+        """
+        Reconstrói o índice a partir das linhas da tabela `alertas`.
+        Retorna os alertas que ainda não estavam no índice.
+        """
+        conhecidos = self.ids
+        self.codigos_voo = {}
+        por_rota = {}
+        for alerta in alertas:
+            por_rota.setdefault((alerta['origem'], alerta['destino']), []).append(alerta)
+
+        self.rotas = {rota: self._montar_indice(linhas) for rota, linhas in por_rota.items()}
+        self.ids = {alerta['id'] for alerta in alertas}
+        return [alerta for alerta in alertas if alerta['id'] not in conhecidos]
+
+    def adicionar(self, alertas):
+        """
+        Inclui alertas recém-criados no índice, sem esperar a próxima recarga.
+        Retorna os que realmente eram novos.
+        """
+        novos = []
+        for alerta in alertas:
+            if alerta['id'] not in self.ids:
+                self.ids.add(alerta['id'])
+                novos.append(alerta)
+
+        por_rota = {}
+        for alerta in novos:
+            por_rota.setdefault((alerta['origem'], alerta['destino']), []).append(alerta)
+        for rota, linhas in por_rota.items():
+            anterior = self.rotas.get(rota)
+            if anterior is None:
+                self.rotas[rota] = self._montar_indice(linhas)
+                continue
+            indice = self._montar_indice(anterior['alertas'] + linhas)
+            indice['ativo'][:len(anterior['alertas'])] = anterior['ativo']
+            self.rotas[rota] = indice
+        return novos
+
+    def total_alertas(self):
+        return sum(len(indice['id']) for indice in self.rotas.values())
+
+    def _teto_atual(self, indice, agora):
+        """Teto de cada alerta da rota, já limitado pelos quantis atuais dos alertas estatísticos."""
+        if not indice['grupos_estatisticos']:
+            return indice['teto']
+        limites = np.array([self.estatisticas.quantil(chave, q, agora) for chave, q in indice['grupos_estatisticos']],
+                           dtype=np.float64)
+        # Sem histórico suficiente (quantil None, que vira NaN) o alerta estatístico não pode disparar
+        limites[np.isnan(limites)] = -np.inf
+
+        teto = indice['teto'].copy()
+        posicoes = indice['posicao_estatistica']
+        teto[posicoes] = np.minimum(teto[posicoes], limites[indice['grupo_estatistico']])
+        return teto
+
+    def avaliar_lote(self, precos, agora, somente_ids=None):
+        """
+        Avalia um lote de preços (dicionários da mensagem) contra os alertas das rotas afetadas.
+        Os alertas estatísticos comparam com o histórico anterior ao lote.
+        Com `somente_ids`, apenas esses alertas são considerados.
+
+        Retorna uma lista de pares (alerta, preço) com, no máximo, um disparo por alerta:
+        o primeiro preço do lote que satisfaz as condições.
+        """
+        posicoes_por_rota = {}
+        for posicao, dados in enumerate(precos):
+            posicoes_por_rota.setdefault((dados['origem'], dados['destino']), []).append(posicao)
+
+        disparos = []
+        for rota, posicoes in posicoes_por_rota.items():
+            indice = self.rotas.get(rota)
+            if indice is None or not indice['ativo'].any():
+                continue
+            ativos = indice['ativo'] if somente_ids is None else indice['ativo'] & np.isin(indice['id'], list(somente_ids))
+
+            valores = np.array([precos[p]['preco'] for p in posicoes], dtype=np.float64)
+            # Voos ainda não vistos em nenhum alerta recebem um código que nunca casa com um alerta de voo
+            voos = np.array([self.codigos_voo.get(precos[p]['id_voo'], -2) for p in posicoes], dtype=np.int64)
+
+            teto = self._teto_atual(indice, agora)
+
+            # Só os alertas ativos entram na matriz, e em blocos de no máximo LIMITE_MATRIZ_AVALIACAO
+            # células, para que a memória não cresça com o número de alertas da rota
+            candidatos = np.flatnonzero(ativos)
+            tamanho_bloco = max(1, LIMITE_MATRIZ_AVALIACAO // len(posicoes))
+            for inicio in range(0, len(candidatos), tamanho_bloco):
+                bloco = candidatos[inicio:inicio + tamanho_bloco]
+                voo_bloco = indice['voo'][bloco][:, None]
+
+                # Matriz (alertas do bloco x preços) com todas as condições combinadas
+                corresponde = (
+                    (valores[None, :] <= teto[bloco][:, None])
+                    & (valores[None, :] >= indice['piso'][bloco][:, None])
+                    & ((voo_bloco == QUALQUER_VOO) | (voo_bloco == voos[None, :]))
+                )
+                disparou = corresponde.any(axis=1)
+                if not disparou.any():
+                    continue
+
+                primeiro_preco = corresponde.argmax(axis=1)
+                for b in np.flatnonzero(disparou):
+                    disparos.append((indice['alertas'][bloco[b]], precos[posicoes[primeiro_preco[b]]]))
+
+                # Alerta disparado não dispara de novo, nem antes da próxima recarga
+                indice['ativo'][bloco[disparou]] = False
+
+        return disparos
+
+class JanelaPrecosRecentes:
+    """
+    Último preço capturado de cada voo, agrupado por rota, para avaliar alertas novos sem consultar o banco.
+    A janela é limitada em idade (JANELA_RECENTE_SEGUNDOS, medida pelo timestamp de captura) e em
+    quantidade de voos (LRU). Um preço mais antigo que o já guardado (por exemplo, reprocessado da DLQ)
+    não substitui o mais novo.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_JANELA_RECENTE, idade_maxima=JANELA_RECENTE_SEGUNDOS):
+        self.capacidade = capacidade
+        self.idade_maxima = idade_maxima
+        self._precos = OrderedDict()  # (origem, destino, id_voo) -> (dados do preço, capturado em)
+        self._voos_por_rota = {}
+
+    def registrar(self, dados_do_preco, agora):
+        rota = (dados_do_preco['origem'], dados_do_preco['destino'])
+        chave = rota + (dados_do_preco['id_voo'],)
+        anterior = self._precos.get(chave)
+        if anterior is not None and anterior[0]['timestamp'] >= dados_do_preco['timestamp']:
+            return
+        # Timestamps adiantados contam como capturados agora, para não ficarem "frescos" para sempre
+        self._precos[chave] = (dados_do_preco, min(dados_do_preco['timestamp'], agora))
+        self._precos.move_to_end(chave)
+        self._voos_por_rota.setdefault(rota, set()).add(dados_do_preco['id_voo'])
+
+        if len(self._precos) > self.capacidade:
+            (origem, destino, id_voo), _ = self._precos.popitem(last=False)
+            voos = self._voos_por_rota[(origem, destino)]
+            voos.discard(id_voo)
+            if not voos:
+                del self._voos_por_rota[(origem, destino)]
+
+    def precos_da_rota(self, rota, agora):
+        """Últimos preços de cada voo da rota que ainda estão dentro da idade máxima."""
+        precos = []
+        for id_voo in self._voos_por_rota.get(rota, ()):
+            dados_do_preco, capturado_em = self._precos[rota + (id_voo,)]
+            if agora - capturado_em <= self.idade_maxima:
+                precos.append(dados_do_preco)
+        return precos
+
+def carregar_alertas_ativos(db_conn):
+    """Lê todos os alertas ativos do banco."""
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, email_usuario, id_voo, origem, destino, tipo_alerta,
+                   preco_desejado, preco_minimo, percentual_queda, preco_referencia, percentil_historico
+            FROM alertas
+            WHERE status = 'ativo';
+        """)
+        alertas = cur.fetchall()
+    db_conn.commit()
+    return alertas
+
+def carregar_estatisticas(db_conn, estatisticas):
+    """Restaura o último checkpoint das estatísticas, para que um restart não comece do zero."""
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT chave, estado FROM estatisticas_precos;")
+        estatisticas.carregar(cur.fetchall(), time.time())
+    db_conn.commit()
+    print(f"📈 [Motor de Alertas] Estatísticas restauradas para {len(estatisticas.chaves)} voo(s)/rota(s).")
+
+def salvar_checkpoint_estatisticas(db_conn, estatisticas):
+    """Grava no banco o estado das chaves alteradas e remove as que ficaram sem dados na janela."""
+    alteradas, removidas = estatisticas.exportar_alteradas(time.time())
+    try:
+        with db_conn.cursor() as cur:
+            if alteradas:
+                execute_values(cur, """
+                    INSERT INTO estatisticas_precos (chave, estado) VALUES %s
+                    ON CONFLICT (chave) DO UPDATE SET estado = EXCLUDED.estado, atualizado_em = CURRENT_TIMESTAMP;
+                """, [(chave, Json(estado)) for chave, estado in alteradas])
+            if removidas:
+                cur.execute("DELETE FROM estatisticas_precos WHERE chave = ANY(%s);", (removidas,))
+        db_conn.commit()
+        print(f"💾 [Motor de Alertas] Checkpoint de estatísticas: {len(alteradas)} atualizada(s), {len(removidas)} removida(s).")
+    except psycopg2.Error as error:
+        print(f"❌ [Motor de Alertas] Erro ao salvar checkpoint das estatísticas: {error}")
+        db_conn.rollback()
+        # Tenta de novo no próximo checkpoint
+        estatisticas.alteradas.update(chave for chave, _ in alteradas)
+
+def extrair_preco(body):
+    """Decodifica e valida a mensagem de preço; retorna None se ela não puder ser avaliada."""
+    try:
+        dados_do_preco = validar_mensagem(body)
+    except MensagemInvalida as error:
+        print(f"⚠️ [Motor de Alertas] Mensagem malformada ignorada: {', '.join(error.codigos)}")
+        return None
+
+    print(f"🧠 [Motor de Alertas] Preço recebido: {dados_do_preco['id_voo']} por R${dados_do_preco['preco']}")
+    return dados_do_preco
+
+def processar_lote(channel, db_conn, motor, janela, lote):
+    """Avalia um lote de preços, publica as notificações e marca os alertas como disparados."""
+    agora = time.time()
+    disparos = motor.avaliar_lote(lote, agora)
+
+    # Só depois da avaliação o lote entra no histórico das estatísticas e na janela recente.
+    # Um preço que não possa ser registrado é descartado sozinho, sem derrubar o motor
+    for dados_do_preco in lote:
+        try:
+            if not motor.estatisticas.registrar(dados_do_preco, dados_do_preco['timestamp'], agora):
+                print(f"⚠️ [Motor de Alertas] Timestamp adiantado ignorado nas estatísticas: {dados_do_preco['timestamp']}")
+            janela.registrar(dados_do_preco, agora)
+        except Exception as error:
+            print(f"❌ [Motor de Alertas] Erro ao registrar o preço de {dados_do_preco['id_voo']}: {error}")
+
+    notificar_disparos(channel, db_conn, motor.estatisticas, disparos)
+
+def avaliar_alertas_novos(channel, db_conn, motor, janela, alertas):
+    """Avalia alertas recém-chegados contra os preços da janela recente das suas rotas."""
+    if not alertas:
+        return
+    agora = time.time()
+    rotas = {(alerta['origem'], alerta['destino']) for alerta in alertas}
+    precos = [dados_do_preco for rota in rotas for dados_do_preco in janela.precos_da_rota(rota, agora)]
+    print(f"🆕 [Motor de Alertas] {len(alertas)} alerta(s) novo(s) avaliado(s) contra {len(precos)} preço(s) recente(s).")
+    disparos = motor.avaliar_lote(precos, agora, somente_ids={alerta['id'] for alerta in alertas})
+    notificar_disparos(channel, db_conn, motor.estatisticas, disparos)
+
+def receber_alertas_novos(channel, motor):
+    """Esvazia a fila de alertas novos, incluindo-os no índice; retorna os que ainda não eram conhecidos."""
+    recebidos = []
+    while True:
+        method, properties, body = channel.basic_get(queue=NOVOS_ALERTAS_QUEUE, auto_ack=True)
+        if method is None:
+            break
+        try:
+            recebidos.append(json.loads(body))
+        except json.JSONDecodeError:
+            print(f"❌ [Motor de Alertas] Aviso de alerta novo com JSON inválido ignorado")
+    return motor.adicionar(recebidos) if recebidos else []
+
+def notificar_disparos(channel, db_conn, estatisticas, disparos):
+    """
+    Publica uma notificação por disparo, com a média móvel e o mínimo da semana do voo,
+    e marca os alertas como disparados.
+    """
+    if not disparos:
+        return
+
+    try:
+        for alerta, dados_do_preco in disparos:
+            print(f"🎯 Alerta correspondente encontrado para {alerta['email_usuario']}! "
+                  f"Rota {alerta['origem']}->{alerta['destino']} ({alerta.get('tipo_alerta', TIPO_VOO)})")
+
+            # 1. Publica uma mensagem na fila de notificação
+            mensagem_notificacao = {
+                'email': alerta['email_usuario'],
+                'id_alerta': alerta['id'],
+                'tipo_alerta': alerta.get('tipo_alerta', TIPO_VOO),
+                'id_voo': dados_do_preco['id_voo'],
+                'origem': dados_do_preco['origem'],
+                'destino': dados_do_preco['destino'],
+                'preco_encontrado': dados_do_preco['preco']
+            }
+            if alerta.get('percentil_historico') is not None:
+                mensagem_notificacao['percentil_historico'] = float(alerta['percentil_historico'])
+            resumo = estatisticas.resumo(chave_voo(dados_do_preco['id_voo']))
+            if resumo is not None:
+                mensagem_notificacao['media_movel'] = resumo['ewma']
+                mensagem_notificacao['minimo_semana'] = resumo['minimo']
+            channel.basic_publish(
+                exchange='',
+                routing_key=NOTIFICATION_QUEUE,
+                body=json.dumps(mensagem_notificacao),
+                properties=pika.BasicProperties(
+                    delivery_mode=2, # Mensagem persistente
+                    message_id=f"alerta-{alerta['id']}"  # Um alerta gera no máximo uma notificação
+                )
+            )
+            print(f"   -> Mensagem enviada para a fila de notificação.")
+
+        # 2. Atualiza o status de todos os alertas disparados no lote de uma só vez
+        ids_disparados = [alerta['id'] for alerta, _ in disparos]
+        with db_conn.cursor() as cur:
+            cur.execute("UPDATE alertas SET status = 'disparado' WHERE id = ANY(%s);", (ids_disparados,))
+        db_conn.commit()
+        print(f"   -> Status dos alertas {ids_disparados} atualizado para 'disparado'.")
+
+    except (Exception, psycopg2.Error) as error:
+        print(f"❌ [Motor de Alertas] Erro durante o processamento: {error}")
+        db_conn.rollback()
+
 def main():
     db_conn = connect_postgres()
-    
+    estatisticas = EstatisticasPrecos()
+    carregar_estatisticas(db_conn, estatisticas)
+    motor = MotorVetorizado(estatisticas)
+
     # Conexão com RabbitMQ
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
     channel = connection.channel()
@@ -44,68 +437,59 @@ def main():
     result = channel.queue_declare(queue='', exclusive=True)
     queue_name = result.method.queue
     channel.queue_bind(exchange=EXCHANGE_NAME, queue=queue_name)
-    
+
     # Declara a fila de notificações para onde VAI PUBLICAR
     channel.queue_declare(queue=NOTIFICATION_QUEUE, durable=True)
 
+    # Declara a fila de alertas novos, consultada a cada lote
+    channel.queue_declare(queue=NOVOS_ALERTAS_QUEUE, durable=True)
+
     print("✅ [Motor de Alertas] Pronto. Verificando preços contra alertas...")
 
-    def callback(ch, method, properties, body):
-        try:
-            dados_do_preco = json.loads(body)
-            
-            # Verifica se a mensagem tem os campos obrigatórios
-            if 'preco' not in dados_do_preco or 'id_voo' not in dados_do_preco:
-                print(f"⚠️ [Motor de Alertas] Mensagem malformada ignorada: {dados_do_preco}")
-                return
-                
-            preco_atual = dados_do_preco['preco']
-            id_voo = dados_do_preco['id_voo']
-            
-            print(f"🧠 [Motor de Alertas] Preço recebido: {id_voo} por R${preco_atual}")
-        except json.JSONDecodeError:
-            print(f"❌ [Motor de Alertas] Mensagem com JSON inválido ignorada")
-            return
-        
-        try:
-            with db_conn.cursor() as cur:
-                # Procura por alertas ativos que correspondam ao voo e ao preço
-                cur.execute("""
-                    SELECT * FROM alertas
-                    WHERE id_voo = %s AND preco_desejado >= %s AND status = 'ativo';
-                """, (id_voo, preco_atual))
-                alertas_correspondentes = cur.fetchall()
-
-                if alertas_correspondentes:
-                    for alerta in alertas_correspondentes:
-                        print(f"🎯 Alerta correspondente encontrado para {alerta['email_usuario']}! Preço desejado: R${alerta['preco_desejado']}")
-                        
-                        # 1. Publica uma mensagem na fila de notificação
-                        mensagem_notificacao = {
-                            'email': alerta['email_usuario'],
-                            'id_voo': id_voo,
-                            'preco_encontrado': preco_atual
-                        }
-                        channel.basic_publish(
-                            exchange='',
-                            routing_key=NOTIFICATION_QUEUE,
-                            body=json.dumps(mensagem_notificacao),
-                            properties=pika.BasicProperties(delivery_mode=2) # Mensagem persistente
-                        )
-                        print(f"   -> Mensagem enviada para a fila de notificação.")
-
-                        # 2. Atualiza o status do alerta para 'disparado' para não notificar de novo
-                        cur.execute("UPDATE alertas SET status = 'disparado' WHERE id = %s;", (alerta['id'],))
-                        print(f"   -> Status do alerta ID {alerta['id']} atualizado para 'disparado'.")
-            
-            db_conn.commit()
-
-        except (Exception, psycopg2.Error) as error:
-            print(f"❌ [Motor de Alertas] Erro durante o processamento: {error}")
-            db_conn.rollback()
-
-    channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=True)
-    channel.start_consuming()
+    lote = []
+    janela = JanelaPrecosRecentes()
+    ids_processados = CacheDeduplicacao(CAPACIDADE_DEDUPLICACAO)
+    ultima_recarga = 0.0
+    ultimo_checkpoint = time.monotonic()
+
+    # consume() com inactivity_timeout devolve (None, None, None) quando a fila fica ociosa,
+    # o que nos permite fechar o lote mesmo que ele não tenha enchido
+    for method, properties, body in channel.consume(queue=queue_name, auto_ack=True, inactivity_timeout=ESPERA_LOTE_SEGUNDOS):
+        if body is not None:
+            # Reentregas (por exemplo, do reprocessamento da DLQ) não são avaliadas de novo
+            id_mensagem = id_da_mensagem(properties, body)
+            if id_mensagem in ids_processados:
+                print(f"♻️ [Motor de Alertas] Mensagem duplicada {id_mensagem} ignorada.")
+                continue
+            ids_processados.adicionar(id_mensagem)
+
+            dados_do_preco = extrair_preco(body)
+            if dados_do_preco is not None:
+                lote.append(dados_do_preco)
+            if len(lote) < TAMANHO_LOTE:
+                continue
+
+        if time.monotonic() - ultima_recarga >= RECARGA_ALERTAS_SEGUNDOS:
+            try:
+                # Alertas que não chegaram pela fila (por exemplo, se o aviso do gateway falhou)
+                # também são avaliados contra a janela recente
+                novos = motor.carregar(carregar_alertas_ativos(db_conn))
+                print(f"🔄 [Motor de Alertas] {motor.total_alertas()} alerta(s) ativo(s) carregado(s).")
+                avaliar_alertas_novos(channel, db_conn, motor, janela, novos)
+            except psycopg2.Error as error:
+                print(f"❌ [Motor de Alertas] Erro ao recarregar alertas: {error}")
+                db_conn.rollback()
+            ultima_recarga = time.monotonic()
+
+        avaliar_alertas_novos(channel, db_conn, motor, janela, receber_alertas_novos(channel, motor))
+
+        if lote:
+            processar_lote(channel, db_conn, motor, janela, lote)
+            lote = []
+
+        if time.monotonic() - ultimo_checkpoint >= CHECKPOINT_ESTATISTICAS_SEGUNDOS:
+            salvar_checkpoint_estatisticas(db_conn, estatisticas)
+            ultimo_checkpoint = time.monotonic()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -21,6 +21,8 @@ def callback(ch, method, properties, body):
     print(f"\n📧 [Notificador] Recebida ordem para notificar!")
     print(f"  -> Enviando e-mail de alerta de preço para: {dados['email']}")
     print(f"  -> Voo: {dados['id_voo']} encontrado por R${dados['preco_encontrado']}!")
+    if dados.get('media_movel') is not None and dados.get('minimo_semana') is not None:
+        print(f"  -> Média recente do voo: R${dados['media_movel']:.2f} (mínimo da semana: R${dados['minimo_semana']:.2f})")
     
     # Simula o trabalho de enviar o e-mail
     time.sleep(2)
@@ -2,6 +2,7 @@ import pika
 import json
 import time
 import random
+import uuid
 
 # --- Configurações ---
 # RABBITMQ_HOST = 'localhost' # Aqui usamos o nome do serviço localmente
@@ -90,6 +91,7 @@ def main():
                 body=message_body,
                 properties=pika.BasicProperties(
                     delivery_mode=2,  # Torna a mensagem persistente
+                    message_id=str(uuid.uuid4()),  # ID estável usado pelos consumidores para descartar reentregas
                 )
             )
             
@@ -0,0 +1,26 @@
+"""
+Testes da deduplicação de mensagens (deduplicacao.py).
+Uso: python -m pytest test_deduplicacao.py
+"""
+
+import hashlib
+
+import pika
+
+from deduplicacao import CacheDeduplicacao, id_da_mensagem
+
+def test_id_da_mensagem_usa_message_id_ou_hash_do_corpo():
+    body = b'{"preco": 1}'
+    assert id_da_mensagem(pika.BasicProperties(message_id='abc'), body) == 'abc'
+    assert id_da_mensagem(pika.BasicProperties(), body) == hashlib.sha1(body).hexdigest()
+    assert id_da_mensagem(None, body) == hashlib.sha1(body).hexdigest()
+
+def test_cache_esquece_o_menos_usado():
+    cache = CacheDeduplicacao(2)
+    cache.adicionar('a')
+    cache.adicionar('b')
+    assert 'a' in cache  # Consultar 'a' o torna o mais recente
+    cache.adicionar('c')
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert len(cache) == 2
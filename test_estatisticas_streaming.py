@@ -0,0 +1,66 @@
+"""
+Testes das estatísticas de preço em streaming (estatisticas_streaming.py).
+Uso: python -m pytest test_estatisticas_streaming.py
+"""
+
+import json
+
+import pytest
+
+from estatisticas_streaming import (MIN_AMOSTRAS_QUANTIL, EstatisticasChave, EstatisticasPrecos,
+                                    SketchQuantis)
+
+AGORA = 1700000000.0
+
+def test_sketch_respeita_o_erro_relativo():
+    sketch = SketchQuantis(precisao=0.01)
+    valores = [100 + i for i in range(1000)]
+    for valor in valores:
+        sketch.adicionar(valor)
+    for q in (0.1, 0.5, 0.9):
+        exato = valores[int(q * (len(valores) - 1))]
+        assert sketch.quantil(q) == pytest.approx(exato, rel=0.01)
+
+def test_sketch_mesclado_igual_ao_sketch_unico():
+    unico, primeiro, segundo = SketchQuantis(), SketchQuantis(), SketchQuantis()
+    for valor in range(1, 501):
+        unico.adicionar(valor)
+        (primeiro if valor % 2 else segundo).adicionar(valor)
+    primeiro.mesclar(segundo)
+    assert primeiro.total == unico.total
+    assert primeiro.quantil(0.25) == unico.quantil(0.25)
+
+@pytest.mark.parametrize('amostras, esperado', [(MIN_AMOSTRAS_QUANTIL - 1, None), (MIN_AMOSTRAS_QUANTIL, 500.0)])
+def test_quantil_exige_amostras_minimas(amostras, esperado):
+    estatisticas = EstatisticasChave()
+    for _ in range(amostras):
+        estatisticas.registrar(500.0, AGORA, AGORA)
+    resultado = estatisticas.quantil(0.5, AGORA)
+    assert resultado == (None if esperado is None else pytest.approx(esperado, rel=0.01))
+
+def test_fatias_expiram_com_a_janela():
+    estatisticas = EstatisticasChave(duracao_fatia=3600, janela_dias=1)
+    estatisticas.registrar(100.0, AGORA, AGORA)
+    assert estatisticas.minimo() == 100.0
+    # Um dia depois, a fatia do primeiro preço saiu da janela
+    depois = AGORA + 86400 + 3600
+    estatisticas.registrar(300.0, depois, depois)
+    assert estatisticas.minimo() == 300.0
+
+def test_timestamp_adiantado_e_ignorado():
+    estatisticas = EstatisticasPrecos()
+    dados = {'id_voo': 'G31420', 'origem': 'NAT', 'destino': 'GRU', 'preco': 500.0}
+    assert estatisticas.registrar(dados, AGORA * 1000, AGORA) is False
+    assert estatisticas.chaves == {}
+
+def test_checkpoint_ida_e_volta():
+    estatisticas = EstatisticasChave()
+    for i in range(100):
+        estatisticas.registrar(1000.0 + i, AGORA - i * 600, AGORA)
+
+    # O estado vai para o banco como JSONB
+    restaurada = EstatisticasChave.de_dict(json.loads(json.dumps(estatisticas.para_dict())))
+    assert restaurada.ewma == estatisticas.ewma
+    assert restaurada.minimo() == estatisticas.minimo()
+    assert restaurada.fatia_atual == estatisticas.fatia_atual
+    assert restaurada.quantil(0.1, AGORA) == estatisticas.quantil(0.1, AGORA)
@@ -0,0 +1,32 @@
+"""
+Testes do validador das mensagens de preço (mensagem_preco.py).
+Uso: python -m pytest test_mensagem_preco.py
+"""
+
+import json
+
+import pytest
+
+from mensagem_preco import MensagemInvalida, validar_mensagem
+
+def mensagem(**campos):
+    dados = {'id_voo': 'G31420', 'origem': 'NAT', 'destino': 'GRU', 'preco': 1234.56, 'timestamp': 1700000000.0}
+    dados.update(campos)
+    return json.dumps(dados).encode()
+
+def test_mensagem_valida():
+    assert validar_mensagem(mensagem())['preco'] == 1234.56
+
+def test_campo_ausente():
+    body = json.dumps({'id_voo': 'G31420', 'origem': 'NAT', 'destino': 'GRU', 'timestamp': 1700000000.0})
+    with pytest.raises(MensagemInvalida) as erro:
+        validar_mensagem(body)
+    assert erro.value.codigos == ['campo_ausente:preco']
+
+@pytest.mark.parametrize('campo', ['preco', 'timestamp'])
+def test_infinito_rejeitado(campo):
+    # json.dumps não gera 1e400, então o número vai direto no texto, como um produtor qualquer enviaria
+    body = mensagem(**{campo: 1.0}).replace(f'"{campo}": 1.0'.encode(), f'"{campo}": 1e400'.encode())
+    with pytest.raises(MensagemInvalida) as erro:
+        validar_mensagem(body)
+    assert erro.value.codigos == [f'valor_invalido:{campo}']
@@ -0,0 +1,75 @@
+"""
+Testes do índice vetorizado de alertas (MotorVetorizado, em motor_de_alertas.py).
+Uso: python -m pytest test_motor_de_alertas.py
+"""
+
+from estatisticas_streaming import MIN_AMOSTRAS_QUANTIL, EstatisticasPrecos
+from motor_de_alertas import MotorVetorizado
+
+AGORA = 1700000000.0
+
+def alerta(id, **campos):
+    dados = {
+        'id': id, 'email_usuario': 'teste@exemplo.com', 'tipo_alerta': 'voo', 'id_voo': 'G31420',
+        'origem': 'NAT', 'destino': 'GRU', 'preco_desejado': None, 'preco_minimo': None,
+        'percentual_queda': None, 'preco_referencia': None, 'percentil_historico': None,
+    }
+    dados.update(campos)
+    return dados
+
+def preco(valor, id_voo='G31420'):
+    return {'id_voo': id_voo, 'origem': 'NAT', 'destino': 'GRU', 'preco': valor, 'timestamp': AGORA}
+
+def disparos(motor, precos):
+    return [(a['id'], p['preco'], p['id_voo']) for a, p in motor.avaliar_lote(precos, AGORA)]
+
+def test_faixa_de_preco():
+    motor = MotorVetorizado(EstatisticasPrecos())
+    motor.carregar([alerta(1, preco_desejado=500, preco_minimo=300)])
+    assert disparos(motor, [preco(550), preco(250)]) == []
+    assert disparos(motor, [preco(400)]) == [(1, 400, 'G31420')]
+
+def test_alerta_de_voo_e_de_rota():
+    motor = MotorVetorizado(EstatisticasPrecos())
+    motor.carregar([
+        alerta(1, preco_desejado=500),
+        alerta(2, tipo_alerta='rota', id_voo=None, preco_desejado=500),
+    ])
+    # Outro voo da rota só dispara o alerta de rota
+    assert disparos(motor, [preco(400, id_voo='AD4050')]) == [(2, 400, 'AD4050')]
+
+def test_primeiro_preco_que_satisfaz_e_disparo_unico():
+    motor = MotorVetorizado(EstatisticasPrecos())
+    motor.carregar([alerta(1, preco_desejado=500)])
+    assert disparos(motor, [preco(600), preco(450), preco(300)]) == [(1, 450, 'G31420')]
+    # Alerta disparado fica inativo até a próxima recarga
+    assert disparos(motor, [preco(200)]) == []
+
+def test_queda_sem_referencia_nao_dispara():
+    motor = MotorVetorizado(EstatisticasPrecos())
+    motor.carregar([alerta(1, percentual_queda=10)])
+    assert disparos(motor, [preco(1)]) == []
+
+def test_percentil_com_poucas_amostras_nao_dispara():
+    estatisticas = EstatisticasPrecos()
+    for i in range(MIN_AMOSTRAS_QUANTIL - 1):
+        estatisticas.registrar(preco(1000 + i), AGORA - i, AGORA)
+    motor = MotorVetorizado(estatisticas)
+    motor.carregar([alerta(1, percentil_historico=10)])
+    assert disparos(motor, [preco(1)]) == []
+
+def test_percentil_com_historico_suficiente():
+    estatisticas = EstatisticasPrecos()
+    for i in range(100):
+        estatisticas.registrar(preco(1000 + 10 * i), AGORA - i, AGORA)
+    motor = MotorVetorizado(estatisticas)
+    motor.carregar([alerta(1, percentil_historico=10), alerta(2, percentil_historico=10, preco_desejado=900)])
+    # O p10 fica perto de 1090: 1050 dispara o alerta 1, mas não o 2, limitado a 900
+    assert disparos(motor, [preco(1150), preco(1050)]) == [(1, 1050, 'G31420')]
+
+def test_adicionar_ignora_alertas_ja_indexados():
+    motor = MotorVetorizado(EstatisticasPrecos())
+    motor.carregar([alerta(1, preco_desejado=500)])
+    novos = motor.adicionar([alerta(1, preco_desejado=500), alerta(2, preco_desejado=800)])
+    assert [a['id'] for a in novos] == [2]
+    assert disparos(motor, [preco(700)]) == [(2, 700, 'G31420')]